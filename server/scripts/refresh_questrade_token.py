@@ -1,34 +1,96 @@
 #!/usr/bin/env python3
-"""Manual helper to refresh Questrade OAuth tokens with verbose logging."""
+"""Manual helper to refresh Questrade OAuth tokens, with opt-in verbose logging."""
+
+from __future__ import annotations
 
 import argparse
+import atexit
 import json
+import mmap
 import os
+import re
+import select
+import shutil
+import socket
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache, partial
 from pathlib import Path
-from urllib.parse import urljoin
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Mapping
+from urllib.parse import urlencode, urljoin, urlsplit
+
+if TYPE_CHECKING:
+    import http.client
+    import ssl
 
-try:
     import requests
-except ImportError as exc:  # pragma: no cover - guidance for operators
-    sys.stderr.write(
-        "This script requires the 'requests' package. Install it with 'pip install requests' and rerun.\n"
-    )
-    raise
+    import urllib3
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up, stdlib json is the fallback
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; access is left unlocked there
+    fcntl = None
 
 TOKEN_STORE_PATH = Path(__file__).resolve().parents[1] / "token-store.json"
+TOKEN_STORE_LOCK_PATH = TOKEN_STORE_PATH.with_name("token-store.json.lock")
+# Stores at least this large are parsed straight from a read-only mapping
+# instead of being copied into a bytes object first.
+MMAP_READ_THRESHOLD_BYTES = 64 * 1024
 TOKEN_URL = "https://login.questrade.com/oauth2/token"
 MAX_REDIRECTS = 5
-SESSION_PRESETS = {"python", "node"}
-DRIVERS = {"requests", "node"}
+HTTP_POOL_MAXSIZE = 4
+MAX_PARALLEL_LOGINS = 8
+# Runs longer than this many cycles on the urllib3 driver hold one http.client
+# connection open instead of going through the pool for every request.
+PINNED_CONNECTION_MIN_ITERATIONS = 6
+DECODABLE_CONTENT_ENCODINGS = frozenset({"gzip", "x-gzip", "deflate", "identity"})
+SESSION_PRESETS = frozenset({"python", "node"})
+DRIVERS = frozenset({"requests", "urllib3", "node"})
+USER_AGENT = "python-requests/2.32.5"
+NODE_WORKER_SUPPORTED = hasattr(socket, "AF_UNIX")
+NODE_WORKER_CONNECT_TIMEOUT_SECONDS = 30
+# accept() waits in short slices so a worker that dies during start-up (missing
+# module, syntax error) is reported at once instead of after the full timeout.
+NODE_WORKER_ACCEPT_POLL_SECONDS = 0.1
+FRAME_HEADER = struct.Struct("<I")
+VERBOSE = False
+# Stripped of trailing separators the way expanduser strips HOME, so "~/x"
+# with HOME=/ expands to "/x" rather than "//x".
+HOME_DIRECTORY = os.path.expanduser("~").rstrip(os.sep)
+# requests folds multiple Set-Cookie headers into one comma-joined string, and
+# Expires= attributes contain commas too, so match "name=" only where a cookie
+# can start (beginning of the string or after a comma) and the token is a valid
+# RFC 6265 cookie name.
+COOKIE_NAME_PATTERN = re.compile(r"(?:^|,)\s*([A-Za-z0-9!#$%&'*+\-.^_`|~]+)=")
+
+
+def log(*values: object) -> None:
+    """Print diagnostic output only when --verbose was requested."""
+    if VERBOSE:
+        print(*values)
 
 
 def expand_path(path: str | None) -> str | None:
     if not path:
         return None
-    return os.path.abspath(os.path.expanduser(path))
+    if path == "~" or path.startswith(("~/", "~" + os.sep)):
+        path = (HOME_DIRECTORY + path[1:]) or os.sep
+    elif path.startswith("~"):
+        # "~otheruser/..." still needs the passwd lookup.
+        path = os.path.expanduser(path)
+    return os.path.abspath(path)
 
 
 def mask_token(token: str) -> str:
@@ -39,17 +101,151 @@ def mask_token(token: str) -> str:
     return f"{token[:4]}…{token[-4:]}"
 
 
+def dumps_json(payload: object, *, pretty: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE if pretty else 0
+        return orjson.dumps(payload, option=option)
+    if pretty:
+        return (json.dumps(payload, indent=2, sort_keys=False) + "\n").encode("utf-8")
+    return json.dumps(payload).encode("utf-8")
+
+
+def loads_json(data: bytes | memoryview | str) -> object:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+@contextmanager
+def token_store_lock() -> Iterator[None]:
+    """Serialize read-modify-write updates of token-store.json across helpers.
+
+    The lock lives on a sibling file because writers replace token-store.json
+    itself, which would leave a lock taken on the old inode meaningless. Plain
+    reads need no lock since every write is an atomic replace.
+    """
+    if fcntl is None:
+        yield
+        return
+    descriptor = os.open(TOKEN_STORE_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the flock.
+        os.close(descriptor)
+
+
 def load_token_store() -> dict:
     if not TOKEN_STORE_PATH.exists():
         raise SystemExit(f"token-store.json not found at {TOKEN_STORE_PATH}")
-    with TOKEN_STORE_PATH.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+    with TOKEN_STORE_PATH.open("rb") as handle:
+        if os.fstat(handle.fileno()).st_size < MMAP_READ_THRESHOLD_BYTES:
+            return loads_json(handle.read())
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mmap, "MADV_WILLNEED"):
+                mapped.madvise(mmap.MADV_WILLNEED)
+            with memoryview(mapped) as view:
+                return loads_json(view)
 
 
 def persist_token_store(payload: dict) -> None:
-    with TOKEN_STORE_PATH.open("w", encoding="utf-8") as handle:
-        json.dump(payload, handle, indent=2, sort_keys=False)
-        handle.write("\n")
+    # Serialize up front and write the whole document with a single syscall to a
+    # sibling temp file, then rename it over the store so readers never observe a
+    # partially written token-store.json. Callers updating an existing store
+    # should hold token_store_lock() across their reload and this write.
+    data = dumps_json(payload, pretty=True)
+    temporary_path = TOKEN_STORE_PATH.with_suffix(".json.tmp")
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(descriptor, view)
+            view = view[written:]
+    finally:
+        os.close(descriptor)
+    os.replace(temporary_path, TOKEN_STORE_PATH)
+
+
+class TokenStoreWriter:
+    """Holds token-store.json in memory and writes it back once when the run ends."""
+
+    def __init__(self) -> None:
+        self.store: dict = {}
+        # Logins whose refresh token changed since the last flush, keyed by
+        # identity; their updatedAt stamp is assigned when the flush happens.
+        self.pending_logins: dict[int, dict] = {}
+        # --all refreshes logins from worker threads, so updates and the flush
+        # are serialized.
+        self.lock = threading.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending_logins)
+
+    def record_update(self, login: dict) -> None:
+        with self.lock:
+            self.pending_logins[id(login)] = login
+
+    def __enter__(self) -> "TokenStoreWriter":
+        self.store = load_token_store()
+        # Still persist the newest token if the process dies before __exit__;
+        # Questrade invalidates the previous refresh token as soon as it rotates.
+        atexit.register(self.flush)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        atexit.unregister(self.flush)
+        self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+            for login in self.pending_logins.values():
+                login["updatedAt"] = timestamp
+            # Another helper (or the server) may have rotated other logins since
+            # this run loaded the store. Writing our stale copy back would revert
+            # those tokens, which Questrade has already invalidated, so merge only
+            # our own rotations into the current file under the lock.
+            with token_store_lock():
+                current = load_token_store() if TOKEN_STORE_PATH.exists() else self.store
+                if current is not self.store:
+                    positions = {id(login): index for index, login in enumerate(self.store.get("logins") or [])}
+                    merge_rotated_logins(
+                        current,
+                        [(positions.get(key), login) for key, login in self.pending_logins.items()],
+                    )
+                current["updatedAt"] = timestamp
+                persist_token_store(current)
+            self.pending_logins.clear()
+        log("[python-refresh] Saved token store", str(TOKEN_STORE_PATH))
+
+
+def merge_rotated_logins(store: dict, rotated_logins: Iterable[tuple[int | None, dict]]) -> None:
+    """Copy rotated tokens into ``store``, given (position when loaded, login) pairs."""
+    logins = store.setdefault("logins", [])
+    logins_by_id = {login["id"]: login for login in logins if login.get("id")}
+    for position, rotated in rotated_logins:
+        if rotated.get("id"):
+            target = logins_by_id.get(rotated["id"])
+        elif position is not None and position < len(logins) and not logins[position].get("id"):
+            # The server names id-less logins after their position, so that is
+            # the only identity they have; matching them by id would send every
+            # one of them to the last id-less login.
+            target = logins[position]
+        else:
+            target = None
+        if target is None:
+            # Never drop a rotated token: the previous one is already invalid.
+            logins.append(dict(rotated))
+            continue
+        target["refreshToken"] = rotated["refreshToken"]
+        target["updatedAt"] = rotated["updatedAt"]
 
 
 def find_login(store: dict, login_id: str | None) -> dict:
@@ -64,52 +260,234 @@ def find_login(store: dict, login_id: str | None) -> dict:
     return logins[0]
 
 
-def refresh_once(session: requests.Session, refresh_token: str) -> requests.Response:
+def resolve_redirect(current_url: str, location: str) -> str:
+    # Questrade's redirects are absolute, so skip urljoin's full parse of both
+    # URLs unless the Location header is actually relative.
+    if location.startswith(("https://", "http://")):
+        return location
+    return urljoin(current_url, location)
+
+
+def refresh_once(session: requests.Session, refresh_token: str) -> tuple[int, bytes]:
     current_url = TOKEN_URL
     params = {"grant_type": "refresh_token", "refresh_token": refresh_token}
 
     for attempt in range(MAX_REDIRECTS + 1):
-        cookie_header = session.cookies.get_dict()
-        print(
-            f"[python-refresh] Attempt {attempt + 1}: GET {current_url}",
-            {
-                "params": list(params.keys()) if params else [],
-                "cookies": sorted(cookie_header.keys()),
-            },
-        )
+        # The cookie-jar walk and name parsing only feed diagnostics, so skip
+        # them entirely unless --verbose is on.
+        if VERBOSE:
+            cookie_header = session.cookies.get_dict()
+            log(
+                f"[python-refresh] Attempt {attempt + 1}: GET {current_url}",
+                {
+                    "params": list(params.keys()) if params else [],
+                    "cookies": sorted(cookie_header.keys()),
+                },
+            )
         response = session.get(current_url, params=params, allow_redirects=False)
         location = response.headers.get("location")
-        set_cookies = response.headers.get("set-cookie")
-        cookie_names = []
-        if set_cookies:
-            cookie_names = [part.split("=", 1)[0].strip() for part in set_cookies.split(",") if part]
-        print(
-            f"[python-refresh] Attempt {attempt + 1} status {response.status_code}",
-            {"location": location, "setCookies": cookie_names},
-        )
+        if VERBOSE:
+            set_cookies = response.headers.get("set-cookie")
+            cookie_names = COOKIE_NAME_PATTERN.findall(set_cookies) if set_cookies else []
+            log(
+                f"[python-refresh] Attempt {attempt + 1} status {response.status_code}",
+                {"location": location, "setCookies": cookie_names},
+            )
         if 300 <= response.status_code < 400 and location:
-            current_url = urljoin(current_url, location)
+            current_url = resolve_redirect(current_url, location)
             params = None
             continue
-        return response
+        return response.status_code, response.content
     raise RuntimeError("Exceeded maximum redirect attempts during refresh")
 
 
-def update_login_refresh_token(store: dict, login: dict, new_token: str) -> None:
+def refresh_once_direct(
+    send: Callable[[str, str | None], tuple[int, str | None, list[str], bytes]],
+    cookies_by_host: dict[str, dict[str, str]],
+    refresh_token: str,
+) -> tuple[int, bytes]:
+    """Same exchange as refresh_once, over a transport without a cookie jar.
+
+    ``send(url, cookie_header)`` performs one GET without following redirects
+    and returns ``(status, location, set_cookie_headers, body)``. Cookies are
+    tracked per host in ``cookies_by_host`` (shared across cycles) and replayed
+    manually, mirroring what the requests session does for Cloudflare's
+    __cf_bm cookie.
+    """
+    current_url = TOKEN_URL
+    params = {"grant_type": "refresh_token", "refresh_token": refresh_token}
+
+    for attempt in range(MAX_REDIRECTS + 1):
+        host_cookies = cookies_by_host.setdefault(urlsplit(current_url).hostname or "", {})
+        cookie_header = None
+        if host_cookies:
+            cookie_header = "; ".join(f"{name}={value}" for name, value in host_cookies.items())
+        if VERBOSE:
+            log(
+                f"[python-refresh] Attempt {attempt + 1}: GET {current_url}",
+                {
+                    "params": list(params.keys()) if params else [],
+                    "cookies": sorted(host_cookies.keys()),
+                },
+            )
+        request_url = f"{current_url}?{urlencode(params)}" if params else current_url
+        status, location, set_cookies, body = send(request_url, cookie_header)
+        for set_cookie in set_cookies:
+            name, _, value = set_cookie.partition(";")[0].partition("=")
+            host_cookies[name.strip()] = value.strip()
+        if VERBOSE:
+            log(
+                f"[python-refresh] Attempt {attempt + 1} status {status}",
+                {"location": location, "setCookies": [cookie.partition("=")[0].strip() for cookie in set_cookies]},
+            )
+        if 300 <= status < 400 and location:
+            current_url = resolve_redirect(current_url, location)
+            params = None
+            continue
+        return status, body
+    raise RuntimeError("Exceeded maximum redirect attempts during refresh")
+
+
+def send_with_pool(
+    pool: urllib3.PoolManager,
+    url: str,
+    cookie_header: str | None,
+) -> tuple[int, str | None, list[str], bytes]:
+    headers = pool.headers
+    if cookie_header:
+        headers = {**pool.headers, "Cookie": cookie_header}
+    response = pool.request("GET", url, headers=headers, redirect=False, retries=False)
+    return response.status, response.headers.get("location"), response.headers.getlist("set-cookie"), response.data
+
+
+def can_decode_content(headers: dict[str, str]) -> bool:
+    """Whether decode_content handles every encoding the headers advertise."""
+    encodings = {value.split(";")[0].strip().lower() for value in headers.get("Accept-Encoding", "").split(",")}
+    return encodings - {""} <= DECODABLE_CONTENT_ENCODINGS
+
+
+def decode_content(body: bytes, encoding: str | None) -> bytes:
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate data without the zlib wrapper.
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+class PinnedConnection:
+    """A single http.client connection reused for every request of a long run.
+
+    This is the leanest CPython HTTP path: no pool lookup per request, and a
+    new TCP + TLS connection is only opened when a redirect points at another
+    origin or the server has closed the idle socket. Such reconnects offer the
+    TLS session of the previous connection so the server can resume it.
+    """
+
+    def __init__(self, headers: dict[str, str]) -> None:
+        self.headers = headers
+        self.origin: tuple[str, str, int | None] | None = None
+        self.connection: http.client.HTTPConnection | None = None
+        self.tls_session: ssl.SSLSession | None = None
+
+    def send(self, url: str, cookie_header: str | None) -> tuple[int, str | None, list[str], bytes]:
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname or "", parts.port)
+        if self.connection is None or origin != self.origin or self.is_dropped():
+            self.close()
+            self.connection = self.open(*origin)
+            self.origin = origin
+
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        headers = self.headers
+        if cookie_header:
+            headers = {**self.headers, "Cookie": cookie_header}
+
+        self.connection.request("GET", target, headers=headers)
+        sock = self.connection.sock
+        response = self.connection.getresponse()
+        # TLS 1.3 tickets arrive after the handshake, so the session is taken
+        # once the response headers have been read, while the response still
+        # holds the socket open even if the server asked to close it. It is
+        # also handed to the connection for http.client's own auto-reconnect.
+        session = getattr(sock, "session", None)
+        if session is not None:
+            self.tls_session = self.connection.session = session
+        body = decode_content(response.read(), response.getheader("content-encoding"))
+        set_cookies = response.headers.get_all("set-cookie") or []
+        return response.status, response.getheader("location"), set_cookies, body
+
+    def is_dropped(self) -> bool:
+        # An idle keep-alive socket only becomes readable once the server has
+        # closed or reset it. A missing socket is reopened by http.client itself.
+        sock = self.connection.sock if self.connection else None
+        if sock is None:
+            return False
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable)
+
+    def open(self, scheme: str, host: str, port: int | None) -> http.client.HTTPConnection:
+        # Imported lazily: only long urllib3 runs pin a connection, and
+        # http.client pulls in ssl and the email parser.
+        import http.client
+
+        if scheme == "https":
+            # Only resume sessions negotiated with the same host.
+            session = self.tls_session if self.origin and self.origin[1] == host else None
+            return resuming_https_connection_class()(host, port, session=session)
+        return http.client.HTTPConnection(host, port)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+@lru_cache(maxsize=None)
+def resuming_https_connection_class() -> type[http.client.HTTPSConnection]:
+    """Build the HTTPSConnection subclass on first use, so http.client stays off
+    the start-up path of every other driver."""
+    import http.client
+
+    class ResumingHTTPSConnection(http.client.HTTPSConnection):
+        """HTTPSConnection that hands a previous TLS session to the handshake.
+
+        CPython only attempts resumption when an ``SSLSession`` is passed to
+        ``wrap_socket``, which ``HTTPSConnection.connect`` never does.
+        """
+
+        def __init__(self, host: str, port: int | None, *, session: ssl.SSLSession | None) -> None:
+            super().__init__(host, port, context=build_ssl_context())
+            self.session = session
+
+        def connect(self) -> None:
+            http.client.HTTPConnection.connect(self)
+            self.sock = build_ssl_context().wrap_socket(self.sock, server_hostname=self.host, session=self.session)
+            if self.session is not None:
+                log("[python-refresh] TLS session resumed", self.sock.session_reused)
+
+    return ResumingHTTPSConnection
+
+
+def update_login_refresh_token(writer: TokenStoreWriter, login: dict, new_token: str) -> None:
     if not new_token:
         return
     if login.get("refreshToken") == new_token:
         return
-    print(
-        "[python-refresh] Persisting new refresh token",
+    log(
+        "[python-refresh] Recording new refresh token",
         mask_token(login.get("refreshToken")),
         "→",
         mask_token(new_token),
     )
     login["refreshToken"] = new_token
-    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    login["updatedAt"] = store["updatedAt"] = timestamp
-    persist_token_store(store)
+    writer.record_update(login)
 
 
 def perform_refreshes(
@@ -118,6 +496,8 @@ def perform_refreshes(
     preset: str,
     driver: str,
     *,
+    refresh_all: bool = False,
+    force_close: bool = False,
     trace_path: str | None = None,
     node_method: str | None = None,
     node_client: str | None = None,
@@ -128,52 +508,140 @@ def perform_refreshes(
     node_tls_ciphers: str | None = None,
     node_headers: dict[str, str] | None = None,
 ) -> None:
-    store = load_token_store()
-    login = find_login(store, login_id)
-    token = login.get("refreshToken")
-    if not token:
-        raise SystemExit("Selected login does not include a refreshToken field")
+    with TokenStoreWriter() as writer:
+        if refresh_all:
+            logins = [login for login in writer.store.get("logins") or [] if login.get("refreshToken")]
+            if not logins:
+                raise SystemExit("token-store.json does not include any logins with a refreshToken")
+        else:
+            login = find_login(writer.store, login_id)
+            if not login.get("refreshToken"):
+                raise SystemExit("Selected login does not include a refreshToken field")
+            logins = [login]
 
-    print(
+        if driver == "node":
+
+            def refresh_login(login: dict) -> None:
+                log_refresh_start(login)
+                perform_refreshes_with_node_driver(
+                    writer,
+                    login,
+                    login["refreshToken"],
+                    iterations,
+                    trace_path=trace_path,
+                    method=node_method,
+                    client=node_client,
+                    keepalive=node_keepalive,
+                    connection_close=node_connection_close,
+                    tls_min=node_tls_min,
+                    tls_max=node_tls_max,
+                    tls_ciphers=node_tls_ciphers,
+                    headers=node_headers,
+                )
+
+        else:
+            refresh_login = partial(
+                refresh_login_over_http,
+                writer,
+                iterations=iterations,
+                preset=preset,
+                driver=driver,
+                force_close=force_close,
+            )
+        if len(logins) == 1:
+            refresh_login(logins[0])
+            return
+
+        failures: list[str] = []
+        if driver == "node":
+            # The Node worker is a single process handling one frame at a time,
+            # so logins are refreshed one after another on this path.
+            for login in logins:
+                try:
+                    refresh_login(login)
+                except (Exception, SystemExit) as exc:
+                    failures.append(f"{login.get('id')}: {exc}")
+        else:
+            # Imported lazily so single-login runs never load concurrent.futures.
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_LOGINS, len(logins))) as executor:
+                futures = {executor.submit(refresh_login, login): login for login in logins}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except (Exception, SystemExit) as exc:
+                        failures.append(f"{futures[future].get('id')}: {exc}")
+        if failures:
+            raise SystemExit("Refresh failed for some logins:\n  " + "\n  ".join(failures))
+
+
+def log_refresh_start(login: dict) -> None:
+    log(
         "[python-refresh] Starting",
-        {"loginId": login.get("id"), "label": login.get("label"), "token": mask_token(token)},
+        {"loginId": login.get("id"), "label": login.get("label"), "token": mask_token(login.get("refreshToken"))},
     )
 
-    driver_key = driver.lower().strip()
-    if driver_key not in DRIVERS:
-        raise SystemExit(f"Unsupported driver '{driver}'. Expected one of: {sorted(DRIVERS)}")
-
-    if driver_key == "node":
-        perform_refreshes_with_node_driver(
-            store,
-            login,
-            token,
-            iterations,
-            trace_path=trace_path,
-            method=node_method,
-            client=node_client,
-            keepalive=node_keepalive,
-            connection_close=node_connection_close,
-            tls_min=node_tls_min,
-            tls_max=node_tls_max,
-            tls_ciphers=node_tls_ciphers,
-            headers=node_headers,
-        )
-        return
 
-    session = build_session(preset)
+def refresh_login_over_http(
+    writer: TokenStoreWriter,
+    login: dict,
+    *,
+    iterations: int,
+    preset: str,
+    driver: str,
+    force_close: bool,
+) -> None:
+    """Run every refresh cycle for one login with its own session or pool.
+
+    Each call builds its own HTTP client so that --all workers never share
+    cookies or pooled connections across threads.
+    """
+    log_refresh_start(login)
+    pinned_connection: PinnedConnection | None = None
+    headers = build_request_headers(preset, force_close=force_close)
+    # http.client does not decode bodies, so the connection is only pinned when
+    # the preset's Accept-Encoding can be sent unchanged.
+    pin_connection = driver == "urllib3" and iterations >= PINNED_CONNECTION_MIN_ITERATIONS
+    if pin_connection and not can_decode_content(headers):
+        log("[python-refresh] Preset encodings need urllib3 decoding; using the pool", headers["Accept-Encoding"])
+        pin_connection = False
+    if pin_connection:
+        pinned_connection = PinnedConnection(headers)
+        log("[python-refresh] Using a pinned http.client connection", pinned_connection.headers)
+        refresh = partial(refresh_once_direct, pinned_connection.send, {})
+    elif driver == "urllib3":
+        pool = build_pool_manager(preset, force_close=force_close)
+        refresh = partial(refresh_once_direct, partial(send_with_pool, pool), {})
+    else:
+        refresh = partial(refresh_once, build_session(preset, force_close=force_close))
+
+    try:
+        run_refresh_cycles(writer, login, login["refreshToken"], iterations, refresh)
+    finally:
+        if pinned_connection is not None:
+            pinned_connection.close()
+
 
+def run_refresh_cycles(
+    writer: TokenStoreWriter,
+    login: dict,
+    token: str,
+    iterations: int,
+    refresh: Callable[[str], tuple[int, bytes]],
+) -> None:
     for index in range(iterations):
-        print(f"[python-refresh] === Refresh cycle {index + 1} of {iterations} ===")
-        response = refresh_once(session, token)
-        if response.status_code != 200:
+        log(f"[python-refresh] === Refresh cycle {index + 1} of {iterations} ===")
+        status, body = refresh(token)
+        if status != 200:
             print(
                 "[python-refresh] Refresh failed",
-                {"status": response.status_code, "body": response.text[:500]},
+                {"status": status, "body": body[:500].decode("utf-8", errors="replace")},
+                file=sys.stderr,
             )
-            response.raise_for_status()
-        payload = response.json()
-        print(
+            raise SystemExit(f"Refresh failed with HTTP status {status}")
+        payload = loads_json(body)
+        log(
             "[python-refresh] Success",
             {
                 "apiServer": payload.get("api_server"),
@@ -182,14 +650,14 @@ def perform_refreshes(
             },
         )
         if payload.get("refresh_token"):
-            update_login_refresh_token(store, login, payload["refresh_token"])
+            update_login_refresh_token(writer, login, payload["refresh_token"])
             token = payload["refresh_token"]
 
-    print("[python-refresh] All refresh cycles completed")
+    log("[python-refresh] All refresh cycles completed")
 
 
 def perform_refreshes_with_node_driver(
-    store: dict,
+    writer: TokenStoreWriter,
     login: dict,
     token: str,
     iterations: int,
@@ -234,88 +702,305 @@ def perform_refreshes_with_node_driver(
 
     if headers:
         config["headers"] = headers
+    if VERBOSE:
+        config["verbose"] = True
+
+    cleaned_config = {key: value for key, value in config.items() if value is not None}
+
+    if NODE_WORKER_SUPPORTED:
+        token = refresh_with_node_worker(writer, login, token, iterations, script_path, cleaned_config)
+    else:
+        token = refresh_with_node_process(writer, login, token, iterations, script_path, cleaned_config)
+
+    log("[python-refresh] Node driver completed", {"iterations": iterations, "finalToken": mask_token(token)})
+
 
+def describe_node_failure(response: dict) -> str:
+    status = response.get("status")
+    body = response.get("body")
+    message = response.get("error")
+    return (
+        "Node driver failed"
+        + (f" with status {status}" if status else "")
+        + (f": {message}" if message else "")
+        + (f" body={body}" if body else "")
+    )
+
+
+def refresh_with_node_worker(
+    writer: TokenStoreWriter,
+    login: dict,
+    token: str,
+    iterations: int,
+    script_path: Path,
+    config: dict,
+) -> str:
+    worker = get_node_worker(script_path)
+    reply = worker.request({"op": "configure", "config": config})
+    if not reply.get("success"):
+        raise SystemExit(describe_node_failure(reply))
+
+    for index in range(iterations):
+        log(f"[python-refresh] === Refresh cycle {index + 1} of {iterations} (Node worker) ===")
+        response = worker.request({"op": "refresh", "refreshToken": token})
+        if not response.get("success"):
+            raise SystemExit(describe_node_failure(response))
+        new_token = response.get("refreshToken")
+        if new_token:
+            update_login_refresh_token(writer, login, new_token)
+            token = new_token
+    return token
+
+
+def refresh_with_node_process(
+    writer: TokenStoreWriter,
+    login: dict,
+    token: str,
+    iterations: int,
+    script_path: Path,
+    config: dict,
+) -> str:
     payload = {
         "refreshToken": token,
         "iterations": iterations,
     }
+    if config:
+        payload["config"] = config
 
-    cleaned_config = {key: value for key, value in config.items() if value is not None}
-    if cleaned_config:
-        payload["config"] = cleaned_config
+    command = ["node", str(script_path), "--stdin"]
 
-    command = [
-        "node",
-        str(script_path),
-        json.dumps(payload),
-    ]
+    log("[python-refresh] Invoking Node driver", command)
+    received_output = False
+    failure: dict | None = None
+    # The helper writes one JSON line per cycle (or a single failure line);
+    # stderr is inherited so its diagnostics stream straight to the terminal.
+    with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE) as process:
+        try:
+            process.stdin.write(dumps_json(payload))
+            process.stdin.close()
+        except BrokenPipeError:
+            # Node exited before reading its input (missing module, syntax
+            # error); its exit status and output are reported below.
+            pass
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = loads_json(line)
+            except json.JSONDecodeError as exc:
+                output = line.decode("utf-8", errors="replace")
+                raise SystemExit(f"Failed to parse Node driver output: {output}") from exc
+            received_output = True
+            if not entry.get("success"):
+                failure = entry
+                break
+            new_token = entry.get("refreshToken")
+            if new_token:
+                update_login_refresh_token(writer, login, new_token)
+                token = new_token
+        return_code = process.wait()
 
-    print("[python-refresh] Invoking Node driver", command)
-    result = subprocess.run(command, capture_output=True, text=True, check=False)
+    if not received_output:
+        raise SystemExit("Node driver did not return any output")
+    if failure is not None or return_code != 0:
+        raise SystemExit(describe_node_failure(failure or {}))
+    return token
 
-    if result.stderr:
-        sys.stderr.write(result.stderr)
 
-    stdout = result.stdout.strip()
-    if not stdout:
-        raise SystemExit("Node driver did not return any output")
+class NodeWorker:
+    """Long-lived Node helper exchanging length-prefixed JSON frames over a Unix socket."""
+
+    def __init__(self, script_path: Path) -> None:
+        self.directory = tempfile.mkdtemp(prefix="questrade-refresh-")
+        socket_path = os.path.join(self.directory, "driver.sock")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(socket_path)
+            listener.listen(1)
+            listener.settimeout(NODE_WORKER_ACCEPT_POLL_SECONDS)
+            command = ["node", str(script_path), "--ipc", socket_path]
+            log("[python-refresh] Starting Node worker", command)
+            self.process = subprocess.Popen(command)
+            try:
+                self.connection = self.accept_worker(listener)
+            except BaseException:
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait()
+                raise
+        except BaseException:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            raise
+        finally:
+            listener.close()
+        self.connection.settimeout(None)
+
+    def accept_worker(self, listener: socket.socket) -> socket.socket:
+        deadline = time.monotonic() + NODE_WORKER_CONNECT_TIMEOUT_SECONDS
+        while True:
+            try:
+                connection, _ = listener.accept()
+                return connection
+            except socket.timeout:
+                pass
+            return_code = self.process.poll()
+            if return_code is not None:
+                raise SystemExit(f"Node worker exited with code {return_code} before connecting")
+            if time.monotonic() >= deadline:
+                raise SystemExit(
+                    f"Node worker did not connect within {NODE_WORKER_CONNECT_TIMEOUT_SECONDS} seconds"
+                )
+
+    def request(self, message: dict) -> dict:
+        body = dumps_json(message)
+        self.connection.sendall(FRAME_HEADER.pack(len(body)) + body)
+        header = self.receive_exactly(FRAME_HEADER.size)
+        (length,) = FRAME_HEADER.unpack(header)
+        return loads_json(self.receive_exactly(length))
+
+    def receive_exactly(self, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = self.connection.recv(size - len(buffer))
+            if not chunk:
+                raise SystemExit("Node worker closed the connection unexpectedly")
+            buffer.extend(chunk)
+        return bytes(buffer)
+
+    def close(self) -> None:
+        try:
+            if self.process.poll() is None:
+                self.request({"op": "quit"})
+                self.process.wait(timeout=NODE_WORKER_CONNECT_TIMEOUT_SECONDS)
+        except (OSError, SystemExit, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        finally:
+            self.connection.close()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_node_worker: NodeWorker | None = None
+
+
+def get_node_worker(script_path: Path) -> NodeWorker:
+    global _node_worker
+    if _node_worker is None:
+        _node_worker = NodeWorker(script_path)
+        atexit.register(shutdown_node_worker)
+    return _node_worker
+
+
+def shutdown_node_worker() -> None:
+    global _node_worker
+    if _node_worker is not None:
+        worker, _node_worker = _node_worker, None
+        worker.close()
+
+
+def build_request_headers(
+    preset: str,
+    *,
+    force_close: bool = False,
+    defaults: Mapping[str, str] | None = None,
+) -> dict[str, str]:
+    if preset == "node":
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json, text/plain, */*",
+            "Accept-Encoding": "gzip, compress, deflate, br",
+        }
+    else:
+        # The HTTP library's own defaults (requests passes its session
+        # defaults in; urllib3 has none, so mirror what requests sends), but
+        # align the User-Agent string so both flows present the same identity
+        # to Questrade.
+        if defaults is None:
+            defaults = {"Accept-Encoding": "gzip, deflate", "Accept": "*/*", "Connection": "keep-alive"}
+        headers = {**defaults, "User-Agent": USER_AGENT}
+
+    if force_close:
+        headers["Connection"] = "close"
+    return headers
+
+
+@lru_cache(maxsize=None)
+def build_ssl_context() -> ssl.SSLContext:
+    """TLS context for the pinned http.client connection.
+
+    A saved ``SSLSession`` can only be resumed through the context that created
+    it, so every reconnect of a run goes through this one cached context.
+    """
+    import ssl
+
+    return ssl.create_default_context()
 
+
+def build_session(preset: str, *, force_close: bool = False) -> requests.Session:
+    # Imported lazily so the Node driver path never pays for loading requests.
     try:
-        response = json.loads(stdout)
-    except json.JSONDecodeError as exc:
-        raise SystemExit(f"Failed to parse Node driver output: {stdout}") from exc
-
-    if result.returncode != 0 or not response.get("success"):
-        status = response.get("status")
-        body = response.get("body")
-        message = response.get("error")
-        raise SystemExit(
-            "Node driver failed"
-            + (f" with status {status}" if status else "")
-            + (f": {message}" if message else "")
-            + (f" body={body}" if body else "")
+        import requests
+        from requests.adapters import HTTPAdapter
+    except ImportError:  # pragma: no cover - guidance for operators
+        sys.stderr.write(
+            "The requests driver requires the 'requests' package. Install it with 'pip install requests' and rerun.\n"
         )
+        raise
 
-    results = response.get("results") or []
-    for entry in results:
-        new_token = entry.get("refreshToken")
-        if new_token:
-            update_login_refresh_token(store, login, new_token)
-            token = new_token
+    session = requests.Session()
+    headers = build_request_headers(preset, force_close=force_close, defaults=session.headers)
+    # A single pooled connection is kept alive across refresh cycles so that
+    # repeated refreshes (--count > 1) reuse the same TCP + TLS session.
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.headers.clear()
+    session.headers.update(headers)
 
-    print("[python-refresh] Node driver completed", {"iterations": iterations, "finalToken": mask_token(token)})
+    log("[python-refresh] Session headers", dict(session.headers))
 
+    return session
 
-def build_session(preset: str) -> requests.Session:
-    preset_key = preset.lower().strip()
-    if preset_key not in SESSION_PRESETS:
-        raise SystemExit(f"Unsupported session preset '{preset}'. Expected one of: {sorted(SESSION_PRESETS)}")
 
-    session = requests.Session()
+def build_pool_manager(preset: str, *, force_close: bool = False) -> urllib3.PoolManager:
+    headers = build_request_headers(preset, force_close=force_close)
 
-    if preset_key == "node":
-        session.headers.clear()
-        session.headers.update(
-            {
-                "User-Agent": "python-requests/2.32.5",
-                "Accept": "application/json, text/plain, */*",
-                "Connection": "close",
-                "Accept-Encoding": "gzip, compress, deflate, br",
-            }
+    try:
+        import urllib3
+    except ImportError:  # pragma: no cover - guidance for operators
+        sys.stderr.write(
+            "The urllib3 driver requires the 'urllib3' package. Install it with 'pip install urllib3' and rerun.\n"
         )
-    else:
-        # Normal requests defaults, but align the User-Agent string so both
-        # flows present the same identity to Questrade.
-        session.headers["User-Agent"] = "python-requests/2.32.5"
+        raise
 
-    print("[python-refresh] Session headers", dict(session.headers))
+    pool = urllib3.PoolManager(num_pools=1, maxsize=HTTP_POOL_MAXSIZE, headers=headers)
 
-    return session
+    log("[python-refresh] Pool headers", headers)
+
+    return pool
+
+
+def normalize_choice(value: str) -> str:
+    return value.strip().lower()
 
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Manually refresh Questrade OAuth tokens")
-    parser.add_argument("--login", dest="login_id", help="Optional login id to refresh")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--login", dest="login_id", help="Optional login id to refresh")
+    selection.add_argument(
+        "--all",
+        dest="refresh_all",
+        action="store_true",
+        help=f"Refresh every login in token-store.json (up to {MAX_PARALLEL_LOGINS} in parallel)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="Log each request, response, and token rotation",
+    )
     parser.add_argument(
         "--count",
         dest="count",
@@ -326,14 +1011,24 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--preset",
         dest="preset",
+        type=normalize_choice,
+        choices=sorted(SESSION_PRESETS),
         default="python",
         help="HTTP header preset to use (python or node). Default: python",
     )
     parser.add_argument(
         "--driver",
         dest="driver",
+        type=normalize_choice,
+        choices=sorted(DRIVERS),
         default="requests",
-        help="HTTP implementation to use: 'requests' (default) or 'node'",
+        help="HTTP implementation to use: 'requests' (default), 'urllib3', or 'node'",
+    )
+    parser.add_argument(
+        "--force-close",
+        dest="force_close",
+        action="store_true",
+        help="Send 'Connection: close' so every refresh opens a new connection (requests/urllib3 drivers)",
     )
     parser.add_argument(
         "--trace",
@@ -387,8 +1082,10 @@ def build_parser() -> argparse.ArgumentParser:
 
 
 def main(argv: list[str] | None = None) -> None:
+    global VERBOSE
     parser = build_parser()
     args = parser.parse_args(argv)
+    VERBOSE = args.verbose
     if args.count <= 0:
         raise SystemExit("--count must be >= 1")
     node_headers: dict[str, str] | None = None
@@ -397,11 +1094,11 @@ def main(argv: list[str] | None = None) -> None:
         for header in args.node_headers:
             if not header or header.strip() == "":
                 continue
-            if ":" not in header:
+            key, separator, value = header.partition(":")
+            if not separator:
                 raise SystemExit(
                     "--node-header values must be in 'Key: Value' format"
                 )
-            key, value = header.split(":", 1)
             node_headers[key.strip()] = value.strip()
 
     node_keepalive: bool | None = None
@@ -413,6 +1110,8 @@ def main(argv: list[str] | None = None) -> None:
         args.count,
         args.preset,
         args.driver,
+        refresh_all=args.refresh_all,
+        force_close=args.force_close,
         trace_path=expand_path(args.trace_path),
         node_method=args.node_method,
         node_client=args.node_client,
@@ -3,6 +3,7 @@ const axios = require('axios');
 const http = require('http');
 const https = require('https');
 const fs = require('fs');
+const net = require('net');
 const path = require('path');
 const zlib = require('zlib');
 const { CookieJar } = require('tough-cookie');
@@ -19,6 +20,15 @@ const DEFAULT_HEADERS = {
 };
 const TOKEN_URL = 'https://login.questrade.com/oauth2/token';
 
+// Progress logging is opt-in (the Python helper's --verbose); errors are always reported.
+let verbose = false;
+
+function logDebug(...args) {
+  if (verbose) {
+    console.error(...args);
+  }
+}
+
 function maskToken(token) {
   if (!token || typeof token !== 'string') {
     return '<missing>';
@@ -432,44 +442,7 @@ async function refreshOnce(client, jar, initialConfig, trace) {
   throw new Error('Exceeded maximum redirects');
 }
 
-let globalTrace = null;
-
-async function main() {
-  const trace = {
-    path: null,
-    iterations: 0,
-    request: {},
-    connection: {},
-    tls: {},
-    events: [],
-  };
-  globalTrace = trace;
-
-  const exitWith = (result, code) => {
-    writeTrace(trace, result);
-    console.log(JSON.stringify(result));
-    process.exit(code);
-  };
-
-  const inputRaw = process.argv[2];
-  if (!inputRaw) {
-    exitWith({ success: false, error: 'Missing JSON payload argument' }, 1);
-  }
-
-  let input;
-  try {
-    input = JSON.parse(inputRaw);
-  } catch (err) {
-    exitWith({ success: false, error: 'Invalid JSON payload', detail: err.message }, 1);
-  }
-
-  const refreshToken = input.refreshToken;
-  const iterations = Number.isFinite(input.iterations) && input.iterations > 0 ? input.iterations : 1;
-
-  if (!refreshToken) {
-    exitWith({ success: false, error: 'Missing refresh token' }, 1);
-  }
-
+function resolveSettings(input) {
   const config = input.config || {};
   const method = (config.method || input.method || 'GET').toUpperCase();
   const tracePath = config.tracePath || input.tracePath || null;
@@ -503,91 +476,346 @@ async function main() {
     agentOptions.honorCipherOrder = true;
   }
 
-  const tracePathResolved = tracePath ? path.resolve(tracePath) : null;
-  trace.path = tracePathResolved;
-  trace.iterations = iterations;
-  trace.request = {
-    url: TOKEN_URL,
+  const url = TOKEN_URL;
+  return {
+    url,
     method,
-    headers: sanitizeHeaders(headers),
+    tracePath: tracePath ? path.resolve(tracePath) : null,
+    headers,
+    clientType,
+    keepAlive,
+    connectionClose,
+    agentOptions,
+    proxyUri: getProxyForUrl(url) || null,
+    verbose: Boolean(config.verbose),
   };
-  const url = TOKEN_URL;
-  const proxyUri = getProxyForUrl(url) || null;
-  trace.connection = { keepAlive, connectionClose, client: clientType, proxy: proxyUri };
-  trace.tls = agentOptions;
+}
+
+function createTrace(settings, iterations) {
+  return {
+    path: settings.tracePath,
+    iterations,
+    request: {
+      url: settings.url,
+      method: settings.method,
+      headers: sanitizeHeaders(settings.headers),
+    },
+    connection: {
+      keepAlive: settings.keepAlive,
+      connectionClose: settings.connectionClose,
+      client: settings.clientType,
+      proxy: settings.proxyUri,
+    },
+    tls: settings.agentOptions,
+    events: [],
+  };
+}
+
+// Performs a single refresh cycle. Transport failures propagate as exceptions so
+// callers can decide whether to abort the run or report the error upstream.
+async function refreshCycle(client, jar, settings, token, trace) {
+  const requestConfig = {
+    url: settings.url,
+    method: settings.method,
+    params: {
+      grant_type: 'refresh_token',
+      refresh_token: token,
+    },
+    headers: { ...settings.headers },
+    connectionClose: settings.connectionClose,
+  };
+
+  const response = await refreshOnce(client, jar, requestConfig, trace);
+
+  if (!response || response.status < 200 || response.status >= 300) {
+    const failureResult = {
+      success: false,
+      status: response ? response.status : null,
+      body: response ? response.data : null,
+    };
+    trace.events.push({ type: 'failure', status: failureResult.status });
+    return failureResult;
+  }
+
+  const payload = response.data || {};
+  logDebug('[node-refresh] success', {
+    status: response.status,
+    apiServer: payload.api_server,
+    expiresIn: payload.expires_in,
+    newToken: maskToken(payload.refresh_token || token),
+  });
+  return {
+    success: true,
+    status: response.status,
+    apiServer: payload.api_server,
+    expiresIn: payload.expires_in,
+    refreshToken: payload.refresh_token,
+  };
+}
+
+function encodeFrame(message) {
+  const body = Buffer.from(JSON.stringify(message), 'utf8');
+  const header = Buffer.alloc(4);
+  header.writeUInt32LE(body.length, 0);
+  return Buffer.concat([header, body]);
+}
+
+function createFrameDecoder(onFrame) {
+  let buffered = Buffer.alloc(0);
+  return (chunk) => {
+    buffered = buffered.length ? Buffer.concat([buffered, chunk]) : chunk;
+    while (buffered.length >= 4) {
+      const length = buffered.readUInt32LE(0);
+      if (buffered.length < 4 + length) {
+        break;
+      }
+      const body = buffered.subarray(4, 4 + length);
+      buffered = buffered.subarray(4 + length);
+      onFrame(body);
+    }
+  };
+}
+
+// Long-lived worker mode: the Python helper owns the refresh loop and sends one
+// length-prefixed JSON frame per request over a Unix domain socket, so Node
+// start-up, the HTTP agent, and the cookie jar are reused across iterations.
+function runIpcWorker(socketPath) {
+  let session = null;
+  let trace = null;
+  let traceResult = null;
+  let queue = Promise.resolve();
+
+  // The trace is written once per run (on quit, before it is replaced, or when
+  // a refresh fails) rather than after every frame, which would rewrite the
+  // ever-growing file on each iteration.
+  const flushTrace = () => {
+    if (trace) {
+      writeTrace(trace, traceResult || { success: true });
+    }
+  };
+
+  const closeSession = async () => {
+    if (session) {
+      const { client } = session;
+      session = null;
+      await client.cleanup?.();
+    }
+  };
+
+  const handleMessage = async (message) => {
+    switch (message.op) {
+      case 'configure': {
+        await closeSession();
+        const settings = resolveSettings(message);
+        verbose = settings.verbose;
+        if (trace && trace.path === settings.tracePath) {
+          // Re-configuring for the next login (--all) keeps appending to the
+          // same trace so earlier logins' events are not overwritten.
+          const next = createTrace(settings, 0);
+          trace.events.push({
+            type: 'configure',
+            request: next.request,
+            connection: next.connection,
+            tls: next.tls,
+          });
+        } else {
+          flushTrace();
+          trace = createTrace(settings, 0);
+          traceResult = null;
+          globalTrace = trace;
+        }
+        session = {
+          settings,
+          client: buildHttpClient(settings.clientType, settings.agentOptions, settings.proxyUri),
+          jar: new CookieJar(),
+        };
+        logDebug('[node-refresh] worker configured', {
+          method: settings.method,
+          client: settings.clientType,
+          keepAlive: settings.keepAlive,
+          connectionClose: settings.connectionClose,
+          proxy: settings.proxyUri,
+        });
+        return { success: true };
+      }
+      case 'refresh': {
+        if (!session) {
+          return { success: false, error: 'Worker has not been configured' };
+        }
+        if (!message.refreshToken) {
+          return { success: false, error: 'Missing refresh token' };
+        }
+        trace.iterations += 1;
+        trace.events.push({ type: 'cycle', index: trace.iterations });
+        logDebug('[node-refresh]', { step: 'cycle', index: trace.iterations });
+        let result;
+        try {
+          result = await refreshCycle(session.client, session.jar, session.settings, message.refreshToken, trace);
+        } catch (err) {
+          trace.events.push({ type: 'failure', message: err.message });
+          result = { success: false, error: err.message };
+        }
+        if (result.success) {
+          traceResult = { success: true, finalRefreshToken: result.refreshToken };
+        } else {
+          traceResult = result;
+          flushTrace();
+        }
+        return result;
+      }
+      case 'quit':
+        flushTrace();
+        await closeSession();
+        return { success: true };
+      default:
+        return { success: false, error: `Unknown operation '${message.op}'` };
+    }
+  };
+
+  const socket = net.createConnection(socketPath);
+  const decode = createFrameDecoder((body) => {
+    queue = queue.then(async () => {
+      let message;
+      try {
+        message = JSON.parse(body.toString('utf8'));
+      } catch (err) {
+        socket.write(encodeFrame({ success: false, error: 'Invalid JSON frame', detail: err.message }));
+        return;
+      }
+      let reply;
+      try {
+        reply = await handleMessage(message);
+      } catch (err) {
+        // Every frame gets a reply, or the parent would wait on it forever.
+        reply = { success: false, error: err.message };
+      }
+      if (message.op === 'quit') {
+        socket.end(encodeFrame(reply), () => process.exit(0));
+        return;
+      }
+      socket.write(encodeFrame(reply));
+    });
+  });
+
+  socket.on('data', decode);
+  socket.on('error', (err) => {
+    console.error('[node-refresh] worker socket error', { message: err.message });
+    process.exit(1);
+  });
+  // The parent closing its end without a quit frame means it exited abruptly.
+  socket.on('end', () => {
+    queue
+      .then(() => {
+        flushTrace();
+        return closeSession();
+      })
+      .finally(() => process.exit(0));
+  });
+}
+
+function readStdin() {
+  return new Promise((resolve, reject) => {
+    const chunks = [];
+    process.stdin.on('data', (chunk) => chunks.push(chunk));
+    process.stdin.on('end', () => resolve(Buffer.concat(chunks).toString('utf8')));
+    process.stdin.on('error', reject);
+  });
+}
+
+let globalTrace = null;
+
+async function main() {
+  const trace = {
+    path: null,
+    iterations: 0,
+    request: {},
+    connection: {},
+    tls: {},
+    events: [],
+  };
+  globalTrace = trace;
+
+  const exitWith = (result, code) => {
+    writeTrace(globalTrace, result);
+    console.log(JSON.stringify(result));
+    process.exit(code);
+  };
+
+  const mode = process.argv[2];
+  if (!mode) {
+    exitWith({ success: false, error: 'Missing JSON payload argument' }, 1);
+  }
+
+  if (mode === '--ipc') {
+    const socketPath = process.argv[3];
+    if (!socketPath) {
+      exitWith({ success: false, error: 'Missing socket path for --ipc' }, 1);
+    }
+    runIpcWorker(socketPath);
+    return;
+  }
+
+  // `--stdin` is what the Python helper uses; a JSON argument is still accepted
+  // for manual runs.
+  const inputRaw = mode === '--stdin' ? await readStdin() : mode;
+
+  let input;
+  try {
+    input = JSON.parse(inputRaw);
+  } catch (err) {
+    exitWith({ success: false, error: 'Invalid JSON payload', detail: err.message }, 1);
+  }
+
+  const refreshToken = input.refreshToken;
+  const iterations = Number.isFinite(input.iterations) && input.iterations > 0 ? input.iterations : 1;
+
+  if (!refreshToken) {
+    exitWith({ success: false, error: 'Missing refresh token' }, 1);
+  }
+
+  const settings = resolveSettings(input);
+  verbose = settings.verbose;
+  Object.assign(trace, createTrace(settings, iterations));
 
   const jar = new CookieJar();
-  const results = [];
   let token = refreshToken;
 
-  console.error('[node-refresh] starting', {
+  logDebug('[node-refresh] starting', {
     token: maskToken(token),
     iterations,
-    method,
-    keepAlive,
-    connectionClose,
-    proxy: proxyUri,
+    method: settings.method,
+    keepAlive: settings.keepAlive,
+    connectionClose: settings.connectionClose,
+    proxy: settings.proxyUri,
   });
 
-  const client = buildHttpClient(clientType, agentOptions, proxyUri);
+  const client = buildHttpClient(settings.clientType, settings.agentOptions, settings.proxyUri);
 
   for (let index = 0; index < iterations; index += 1) {
     trace.events.push({ type: 'cycle', index: index + 1 });
-    console.error('[node-refresh]', { step: 'cycle', index: index + 1 });
+    logDebug('[node-refresh]', { step: 'cycle', index: index + 1 });
 
-    const requestConfig = {
-      url,
-      method,
-      params: {
-        grant_type: 'refresh_token',
-        refresh_token: token,
-      },
-      headers: { ...headers },
-      connectionClose,
-    };
-
-    let response;
+    let result;
     try {
-      response = await refreshOnce(client, jar, requestConfig, trace);
+      result = await refreshCycle(client, jar, settings, token, trace);
     } catch (err) {
       trace.events.push({ type: 'failure', message: err.message });
       exitWith({ success: false, error: err.message }, 1);
     }
 
-    if (!response || response.status < 200 || response.status >= 300) {
-      const failureResult = {
-        success: false,
-        status: response ? response.status : null,
-        body: response ? response.data : null,
-      };
-      trace.events.push({ type: 'failure', status: failureResult.status });
-      exitWith(failureResult, 1);
+    if (!result.success) {
+      exitWith(result, 1);
     }
 
-    const payload = response.data || {};
-    token = payload.refresh_token || token;
-    results.push({
-      status: response.status,
-      apiServer: payload.api_server,
-      expiresIn: payload.expires_in,
-      refreshToken: payload.refresh_token,
-    });
-
-    console.error('[node-refresh] success', {
-      status: response.status,
-      apiServer: payload.api_server,
-      expiresIn: payload.expires_in,
-      newToken: maskToken(token),
-    });
+    // One NDJSON line per cycle lets the caller persist each rotated token as
+    // soon as it arrives instead of waiting for the whole run.
+    console.log(JSON.stringify(result));
+    token = result.refreshToken || token;
   }
 
-  const successResult = {
-    success: true,
-    results,
-    finalRefreshToken: token,
-  };
   await client.cleanup?.();
-  exitWith(successResult, 0);
+  writeTrace(trace, { success: true, finalRefreshToken: token });
+  process.exit(0);
 }
 
 main().catch((err) => {
@@ -0,0 +1,95 @@
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const { spawnSync } = require('node:child_process');
+const fs = require('node:fs');
+const os = require('node:os');
+const path = require('node:path');
+
+const SCRIPTS_DIR = path.join(__dirname, '../scripts');
+const PYTHON = process.env.PYTHON || 'python3';
+
+const pythonAvailable = spawnSync(PYTHON, ['--version']).status === 0;
+
+// Loads the store, rotates the first login (what the helper does without
+// --login), lets `concurrentStore` land on disk as if another writer ran in the
+// meantime, then flushes and returns what ended up in token-store.json.
+function rotateFirstLogin(initialStore, concurrentStore) {
+  const tempDir = fs.mkdtempSync(path.join(os.tmpdir(), 'token-store-merge-'));
+  const storePath = path.join(tempDir, 'token-store.json');
+  fs.writeFileSync(storePath, JSON.stringify(initialStore));
+
+  const script = `
+import json, sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+import refresh_questrade_token as helper
+helper.TOKEN_STORE_PATH = Path(sys.argv[2])
+helper.TOKEN_STORE_LOCK_PATH = Path(sys.argv[2] + ".lock")
+with helper.TokenStoreWriter() as writer:
+    login = helper.find_login(writer.store, None)
+    helper.update_login_refresh_token(writer, login, "a1-rotated")
+    if sys.argv[3] != "null":
+        Path(sys.argv[2]).write_text(sys.argv[3])
+`;
+  try {
+    const result = spawnSync(
+      PYTHON,
+      ['-c', script, SCRIPTS_DIR, storePath, concurrentStore ? JSON.stringify(concurrentStore) : 'null'],
+      { encoding: 'utf8' }
+    );
+    assert.equal(result.status, 0, result.stderr);
+    return JSON.parse(fs.readFileSync(storePath, 'utf8'));
+  } finally {
+    fs.rmSync(tempDir, { recursive: true, force: true });
+  }
+}
+
+test('rotations of logins without an id are merged back by position', { skip: !pythonAvailable }, () => {
+  const initialStore = {
+    logins: [
+      { label: 'first', refreshToken: 'a0' },
+      { label: 'second', refreshToken: 'b0' },
+    ],
+  };
+  const concurrentStore = {
+    logins: [
+      { label: 'first', refreshToken: 'a0' },
+      { label: 'second', refreshToken: 'b1-rotated-elsewhere' },
+    ],
+  };
+
+  const saved = rotateFirstLogin(initialStore, concurrentStore);
+
+  assert.deepEqual(
+    saved.logins.map((login) => [login.label, login.refreshToken]),
+    [
+      ['first', 'a1-rotated'],
+      ['second', 'b1-rotated-elsewhere'],
+    ]
+  );
+});
+
+test('rotations of logins with an id are merged back by id', { skip: !pythonAvailable }, () => {
+  const initialStore = {
+    logins: [
+      { id: 'a', refreshToken: 'a0' },
+      { id: 'b', refreshToken: 'b0' },
+    ],
+  };
+  const concurrentStore = {
+    logins: [
+      { id: 'b', refreshToken: 'b1-rotated-elsewhere' },
+      { id: 'a', refreshToken: 'a0' },
+    ],
+  };
+
+  const saved = rotateFirstLogin(initialStore, concurrentStore);
+
+  assert.deepEqual(
+    saved.logins.map((login) => [login.id, login.refreshToken]),
+    [
+      ['b', 'b1-rotated-elsewhere'],
+      ['a', 'a1-rotated'],
+    ]
+  );
+});